@@ -0,0 +1,276 @@
+"""Benchmark the pipeline scripts without Docker, ssh, Slack or Gerrit
+
+The external services are replaced by the stand-ins of standins.py and the
+results are the best time of --repeat runs:
+    - steps: the overhead of each build step of iso/build.py
+    - scan: the scan of the build-pkgs results tree for N packages
+    - download: the download throughput of rsync/python/download_files.py
+                versus the number of concurrent downloads (needs rsync)
+    - lint: the latency of static_analysis/python/run_analysis.py for M
+            changed python files (needs pylint), the scores are checked
+            against the pylint rating of a fixture first
+
+Example:
+    python benchmarks/run_benchmarks.py --benchmarks scan lint --files 10 50
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from multiprocessing.pool import ThreadPool
+
+from bash import bash
+
+import standins
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = ['steps', 'scan', 'download', 'lint']
+BUILD_STEPS = ['build_srpms', 'build_std', 'build_rt', 'build_installer',
+               'build_iso', 'build_init_files']
+
+
+def best_time(function, repeat, setup=None):
+    """Get the best time of a function
+
+    :param function: the function to measure
+    :param repeat: the number of times the function is run
+    :param setup: a function run (and not measured) before each run
+    :return: the best time in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+
+    return min(times)
+
+
+def import_build(work_dir):
+    """Import iso/build.py against the stand-ins
+
+    :param work_dir: the folder used as stx-tools repository
+    :return: the build module
+    """
+    sys.path.insert(0, os.path.join(REPOSITORY, 'iso'))
+    import build  # pylint: disable=import-error
+
+    build.LOCAL_STX_TOOLS = work_dir
+    build.BUILD_CACHE_PATH = os.path.join(work_dir, 'build-cache')
+    for stage in ['std', 'rt', 'installer']:
+        os.makedirs(os.path.join(work_dir, 'work', 'localdisk', 'loadbuild',
+                                 build.MYUNAME, build.PROJECT, stage,
+                                 'results'))
+    os.makedirs(os.path.join(work_dir, 'work', 'localdisk', 'loadbuild',
+                             build.MYUNAME, build.PROJECT, 'std', 'tmp'))
+
+    return build
+
+
+def benchmark_steps(build, repeat):
+    """Measure the orchestration overhead of each build step
+
+    The container commands are not run, so the time is the overhead of
+    docker exec, the checks of the results and the slack notifications
+    :param build: the build module from import_build
+    :param repeat: the number of runs of each step
+    """
+    for step in BUILD_STEPS:
+        seconds = best_time(getattr(build, step), repeat)
+        print('steps {:<20} {:>10.4f} s'.format(step, seconds))
+
+
+def benchmark_scan(build, packages, repeat):
+    """Measure the scan of the build-pkgs results tree
+
+    :param build: the build module from import_build
+    :param packages: the list with the number of packages of each run
+    :param repeat: the number of runs for each number of packages
+    """
+    results = os.path.join(build.LOCAL_STX_TOOLS, 'work', 'localdisk',
+                           'loadbuild', build.MYUNAME, build.PROJECT, 'std',
+                           'results')
+
+    for number in packages:
+        shutil.rmtree(results)
+        standins.create_results_tree(results, number, failures=1)
+        seconds = best_time(build.build_std, repeat)
+        print('scan  {:>6} packages {:>20.4f} s'.format(number, seconds))
+
+
+def benchmark_download(work_dir, isos, iso_size, concurrency, repeat):
+    """Measure the download throughput versus the concurrent downloads
+
+    :param work_dir: the folder for the server and the downloaded ISOS
+    :param isos: the number of ISOS to download
+    :param iso_size: the size in MB of each ISO
+    :param concurrency: the list with the concurrent downloads of each run
+    :param repeat: the number of runs for each concurrency
+    """
+    if not bash('command -v rsync').value():
+        print('download: rsync is not installed, skipping it')
+        return
+
+    sys.path.insert(0, os.path.join(REPOSITORY, 'rsync', 'python'))
+    import download_files  # pylint: disable=import-error
+
+    server_folder = os.path.join(work_dir, 'server')
+    folder = os.path.join(work_dir, 'downloads')
+    os.makedirs(server_folder)
+    iso_list = standins.create_isos(
+        server_folder, isos, iso_size * 1024 * 1024)
+    download_files.SERVER_IP = 'localhost'
+    download_files.SERVER_FOLDER = server_folder
+
+    def clean():
+        """Remove the downloaded ISOS"""
+        if os.path.isdir(folder):
+            shutil.rmtree(folder)
+        os.makedirs(folder)
+
+    for jobs in concurrency:
+        pool = ThreadPool(jobs)
+        seconds = best_time(
+            lambda: pool.map(
+                lambda iso: download_files.download_iso(iso, folder),
+                iso_list),
+            repeat, setup=clean)
+        pool.close()
+        print('download {:>3} jobs {:>14.1f} MB/s'.format(
+            jobs, isos * iso_size / seconds))
+
+
+def check_score(run_analysis, work_dir):
+    """Check that the score of run_analysis.py is the same than pylint's
+
+    :param run_analysis: the run_analysis module
+    :param work_dir: the folder for the fixture
+    """
+    repository = os.path.join(work_dir, 'score')
+    fixture = standins.create_score_fixture(repository)
+    score = run_analysis.run_pylint(repository, [fixture])[fixture]['score']
+    output = bash('cd {} && pylint --rcfile=.pylintrc --persistent=n {}'
+                  .format(repository, fixture)).value()
+    pylint_score = float(re.search(r'rated at (-?[\d.]+)/10', output).group(1))
+
+    if score != pylint_score:
+        raise SystemExit('lint: the score {} is not the pylint score {}'
+                         .format(score, pylint_score))
+    print('lint  score {} matches pylint'.format(score))
+
+
+def benchmark_lint(work_dir, files, repeat):
+    """Measure the latency of the static analysis
+
+    :param work_dir: the folder for the git repositories and the cache
+    :param files: the list with the number of changed files of each run
+    :param repeat: the number of runs for each number of files
+    """
+    if not bash('command -v pylint').value():
+        print('lint: pylint is not installed, skipping it')
+        return
+
+    cache_dir = os.path.join(work_dir, 'cache')
+    # no lint server, the result cache is cleaned for the cold runs
+    os.environ['STATIC_ANALYSIS_CACHE'] = cache_dir
+    os.environ['LINT_SERVER_SOCKET'] = os.path.join(work_dir, 'no.sock')
+    sys.path.insert(0, os.path.join(REPOSITORY, 'static_analysis', 'python'))
+    import run_analysis  # pylint: disable=import-error
+
+    run_analysis.VERDICT = os.path.join(work_dir, 'VERDICT')
+    check_score(run_analysis, work_dir)
+
+    def clean():
+        """Remove the result cache"""
+        if os.path.isdir(cache_dir):
+            shutil.rmtree(cache_dir)
+
+    for number in files:
+        repository = os.path.join(work_dir, 'repository-{}'.format(number))
+        standins.create_git_repository(repository, number)
+        cold = best_time(
+            lambda: run_analysis.python_static_analysis(repository),
+            repeat, setup=clean)
+        warm = best_time(
+            lambda: run_analysis.python_static_analysis(repository), repeat)
+        print('lint  {:>6} files {:>12.4f} s cold {:>10.4f} s cached'.format(
+            number, cold, warm))
+
+
+def arguments():
+    """Define and handle arguments with options to run the script
+
+    Return:
+     - parser.parse_args(): list arguments as objects assigned as attributes
+       of a namespace
+    """
+
+    description = 'Script used to benchmark the pipeline scripts'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '--benchmarks', dest='benchmarks', nargs='+', choices=BENCHMARKS,
+        default=BENCHMARKS, help='the benchmarks to run')
+    parser.add_argument(
+        '--repeat', dest='repeat', type=int, default=3,
+        help='the number of runs of each measure, the best time is reported')
+    parser.add_argument(
+        '--packages', dest='packages', type=int, nargs='+',
+        default=[100, 1000, 5000], help='the packages of the results tree')
+    parser.add_argument(
+        '--isos', dest='isos', type=int, default=8,
+        help='the number of ISOS to download')
+    parser.add_argument(
+        '--iso-size', dest='iso_size', type=int, default=32,
+        help='the size in MB of each ISO')
+    parser.add_argument(
+        '--concurrency', dest='concurrency', type=int, nargs='+',
+        default=[1, 2, 4], help='the concurrent downloads')
+    parser.add_argument(
+        '--files', dest='files', type=int, nargs='+', default=[10, 50, 200],
+        help='the changed python files to lint')
+
+    return parser.parse_args()
+
+
+def main():
+    """Run the benchmarks against the stand-ins"""
+    args = arguments()
+    work_dir = tempfile.mkdtemp(prefix='pipelines-benchmarks-')
+    docker_daemon, docker_url = standins.start_server(
+        standins.FakeDockerHandler)
+    webhook, webhook_url = standins.start_server(standins.WebhookHandler)
+
+    # the stand-ins must be in place before importing the scripts
+    os.environ['PATH'] = '{}:{}'.format(standins.BIN, os.environ['PATH'])
+    os.environ['DOCKER_HOST'] = docker_url.replace('http', 'tcp')
+    os.environ['SLACK_WEBHOOK_URL'] = webhook_url
+
+    try:
+        if 'steps' in args.benchmarks or 'scan' in args.benchmarks:
+            build = import_build(os.path.join(work_dir, 'stx-tools'))
+            if 'steps' in args.benchmarks:
+                benchmark_steps(build, args.repeat)
+            if 'scan' in args.benchmarks:
+                benchmark_scan(build, args.packages, args.repeat)
+            print('slack messages: {}'.format(
+                standins.WebhookHandler.messages))
+        if 'download' in args.benchmarks:
+            benchmark_download(work_dir, args.isos, args.iso_size,
+                               args.concurrency, args.repeat)
+        if 'lint' in args.benchmarks:
+            benchmark_lint(work_dir, args.files, args.repeat)
+    finally:
+        docker_daemon.shutdown()
+        webhook.shutdown()
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Local stand-ins for the services used by the pipeline scripts
+
+The benchmarks run without Docker, ssh, Slack or a Gerrit repository:
+    - bin/docker: docker client that does not run the commands
+    - bin/ssh: ssh client that runs the remote commands locally
+    - FakeDockerHandler: docker daemon API needed by docker.from_env()
+    - WebhookHandler: slack webhook that only counts the messages
+"""
+from __future__ import print_function
+
+import json
+import os
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+
+from bash import bash
+
+BIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bin')
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Base handler for the stand-in servers"""
+
+    def send_json(self, data):
+        """Send a json response
+
+        :param data: the data to send
+        """
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """Do not log the requests, they are part of the benchmark"""
+
+
+class FakeDockerHandler(StandinHandler):
+    """Answer the docker daemon API calls with an empty docker environment"""
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Handle the GET requests"""
+        path = self.path.split('?')[0].rstrip('/')
+
+        if path.endswith('/version'):
+            self.send_json({'ApiVersion': '1.35', 'Version': '18.03.0-ce'})
+        elif path.endswith('/_ping'):
+            self.send_json('OK')
+        else:
+            # /containers/json, /images/json
+            self.send_json([])
+
+
+class WebhookHandler(StandinHandler):
+    """Receive the slack messages and count them"""
+
+    messages = 0
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Handle the POST requests"""
+        self.rfile.read(int(self.headers['Content-Length']))
+        WebhookHandler.messages += 1
+        self.send_json({'ok': True})
+
+
+def start_server(handler):
+    """Start a local http server in a thread
+
+    :param handler: the request handler of the server
+    :return:
+        - server: the http server, call server.shutdown() to stop it
+        - url: the url of the server
+    """
+    server = HTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    return server, 'http://127.0.0.1:{}'.format(server.server_port)
+
+
+def create_results_tree(results, packages, failures=0):
+    """Create a build-pkgs results tree
+
+    :param results: the results folder, e.g: .../std/results
+    :param packages: the number of packages in the tree
+    :param failures: the number of packages with a fail file
+    """
+    for number in range(packages):
+        package = os.path.join(results, 'package-{}-1.0-r0.tis'.format(number))
+        os.makedirs(package)
+        for name in ['build.log', 'root.log', 'state.log',
+                     'package-{}-1.0-r0.tis.x86_64.rpm'.format(number)]:
+            with open(os.path.join(package, name), 'w') as _file:
+                _file.write(name)
+        if number < failures:
+            open(os.path.join(package, 'fail'), 'w').close()
+
+
+def create_isos(folder, number, size):
+    """Create starlingx ISOS with random content
+
+    :param folder: the folder of the ISOS
+    :param number: the number of ISOS
+    :param size: the size in bytes of each ISO
+    :return: the names of the ISOS
+    """
+    isos = []
+    for day in range(1, number + 1):
+        iso = 'stx-2018-01-{:02d}-{}-master.iso'.format(day, day)
+        with open(os.path.join(folder, iso), 'wb') as _file:
+            _file.write(os.urandom(size))
+        isos.append(iso)
+
+    return isos
+
+
+def create_git_repository(repository, modules):
+    """Create a git repository with a change that modifies python modules
+
+    The first commit adds the modules and the second commit (HEAD) modifies
+    all of them, like a Gerrit change
+    :param repository: the folder of the repository
+    :param modules: the number of python modules
+    """
+    package = os.path.join(repository, 'suite')
+    os.makedirs(package)
+    open(os.path.join(repository, '.pylintrc'), 'w').close()
+    open(os.path.join(package, '__init__.py'), 'w').close()
+
+    template = ('"""Module {number}"""\n'
+                'from suite import module_{previous}\n\n\n'
+                'def function_{number}(value):\n'
+                '    """Function {number}"""\n'
+                '    return module_{previous}.VALUE + value * {factor}\n\n\n'
+                'VALUE = {number}\n')
+    git = 'git -C {} -c user.name=benchmark -c user.email=benchmark@local'\
+        .format(repository)
+    bash('git init -q {}'.format(repository))
+
+    for factor in [1, 2]:
+        for number in range(modules):
+            module = os.path.join(package, 'module_{}.py'.format(number))
+            with open(module, 'w') as _file:
+                _file.write(template.format(
+                    number=number, previous=max(number - 1, 0),
+                    factor=factor))
+        bash('{0} add -A && {0} commit -q -m "change {1}"'.format(
+            git, factor))
+
+
+def create_score_fixture(repository):
+    """Create a python module with docstrings and pylint messages
+
+    The docstrings are not statements for pylint, so the module checks that
+    the scores calculated by run_analysis.py are the same than pylint's
+    :param repository: the folder of the module
+    :return: the name of the module (relative to the repository)
+    """
+    if not os.path.isdir(repository):
+        os.makedirs(repository)
+    open(os.path.join(repository, '.pylintrc'), 'w').close()
+
+    with open(os.path.join(repository, 'fixture.py'), 'w') as _file:
+        _file.write('"""Module with docstrings"""\n'
+                    'import os\n\n'
+                    '"a pointless string statement"\n\n\n'
+                    'def function(value):\n'
+                    '    """Function with a docstring"""\n'
+                    '    return value\n')
+
+    return 'fixture.py'
@@ -6,9 +6,11 @@ from __future__ import print_function
 import argparse
 import datetime
 import getpass
+import glob
 import json
 import os
 import multiprocessing
+import time
 from shutil import copyfile
 from shutil import rmtree
 
@@ -18,6 +20,8 @@ import requests
 from bash import bash
 from git import Repo
 
+import build_logs
+
 # Global variables
 CURRENT_USER = getpass.getuser()
 BASE_PATH = '/var/opt'
@@ -25,6 +29,44 @@ REPOSITORIES = '{}/repositories'.format(BASE_PATH)
 LOCAL_STX_TOOLS = '{}/stx-tools'.format(REPOSITORIES)
 GITHUB_STX_TOOLS = 'https://git.starlingx.io/stx-tools'
 ISO_FOLDER = '{}/html/ISO'.format(BASE_PATH)
+# the output of the build steps is compressed and indexed by build_logs.py
+LOG_WRITER = 'python /localdisk/build_logs.py write'
+# the maximum size of the log excerpts in the slack messages
+MAX_EXCERPTS_SIZE = 3000
+# persistent caches in the host mounted into the builder container
+BUILD_CACHE_PATH = os.environ.get('BUILD_CACHE_PATH', '{}/build-cache'.format(
+    BASE_PATH))
+MB = 1024 * 1024
+GB = 1024 * MB
+# the mock and yum caches are pruned by whole units, the folders at unit_depth,
+# the ccache cache is pruned by ccache itself to its max_cache_size
+BUILD_CACHES = {
+    # compiler output of the mock chroots (see conf_mock_caches)
+    'ccache': {
+        'container_path': '/var/cache/ccache',
+        'max_size': int(os.environ.get('CCACHE_CACHE_SIZE', 20 * GB)),
+        'unit_depth': None},
+    # mock root caches and the yum caches of the mock chroots, a unit is the
+    # folder of a chroot: <chroot>/root_cache, <chroot>/yum_cache
+    'mock': {
+        'container_path': '/var/cache/mock',
+        'max_size': int(os.environ.get('MOCK_CACHE_SIZE', 30 * GB)),
+        'unit_depth': 1},
+    # packages downloaded by yum in the container, a unit is the folder of a
+    # repository: <basearch>/<releasever>/<repository>
+    'yum': {
+        'container_path': '/var/cache/yum',
+        'max_size': int(os.environ.get('YUM_CACHE_SIZE', 10 * GB)),
+        'unit_depth': 3},
+}
+# the counters of the ccache stats files
+CCACHE_MISS = 4
+CCACHE_PREPROCESSED_HIT = 8
+CCACHE_DIRECT_HIT = 22
+# the states logged by mock when a chroot is restored from its root cache and
+# when the root cache is created
+ROOT_CACHE_HIT = 'Start: unpacking root cache'
+ROOT_CACHE_MISS = 'Start: creating root cache'
 
 # Environ variables
 BRANCH = os.environ.get('BRANCH', 'master')
@@ -33,6 +75,9 @@ PROJECT = os.environ.get('PROJECT', 'starlingx')
 MIRROR_PATH = os.environ.get('MIRROR_PATH', '{}/mirror/latest'.format(
     BASE_PATH))
 SLACK_CHANNEL = os.environ.get('SLACK_CHANNEL', '#gerrit_code_review')
+SLACK_WEBHOOK_URL = os.environ.get(
+    'SLACK_WEBHOOK_URL', 'https://hooks.slack.com/services/T9K08FHL4/'
+    'BB4NZK5B2/dXffQfcibJ8wcS8uJ1GkcLKp')
 # SLACK_CHANNEL = os.environ.get('SLACK_CHANNEL', '#building_running')
 
 # Jenkins variables
@@ -98,8 +143,6 @@ def slack_bot(
     elif _type == 'comment':
         color = '#CDCDCD'
 
-    webhook_url = ('https://hooks.slack.com/services/T9K08FHL4/BB4NZK5B2/'
-                   'dXffQfcibJ8wcS8uJ1GkcLKp')
     slack_data = {'text': msg, 'channel': SLACK_CHANNEL}
     attachments = {
         "attachments": [
@@ -124,7 +167,7 @@ def slack_bot(
 
     slack_data.update(attachments)
     response = requests.post(
-        webhook_url, data=json.dumps(slack_data),
+        SLACK_WEBHOOK_URL, data=json.dumps(slack_data),
         headers={'Content-Type': 'application/json'}
     )
 
@@ -164,6 +207,42 @@ def update_mirror():
              '{}/squashfs.img-stx-0.2'.format(tis_installer))
 
 
+def get_failure_excerpts(log_name, packages=None):
+    """Get the excerpts of the failures in the log of a build step
+
+    :param log_name: the compressed log of the build step in /localdisk
+    :param packages: the failed packages, if there is not excerpts for them
+                     the last failure of each package of the log is used
+    :return: the excerpts of the failures formatted for slack
+    """
+    log = '{}/work/localdisk/{}'.format(LOCAL_STX_TOOLS, log_name)
+    if not os.path.isfile('{}.idx'.format(log)):
+        return ''
+
+    excerpts = build_logs.query(log, packages, max_hits=1)
+    if not excerpts:
+        excerpts = build_logs.query(log, max_hits=1)
+
+    message = ''
+    for package, excerpt in excerpts:
+        excerpt = '\n*{}*\n```{}```'.format(package, excerpt)
+        if len(message) + len(excerpt) > MAX_EXCERPTS_SIZE:
+            break
+        message += excerpt
+
+    return message
+
+
+def get_failed_packages(fail_files):
+    """Get the failed packages from the fail files of build-pkgs
+
+    :param fail_files: the fail files in the results folder, one per line
+    :return: the failed packages, e.g: .../results/<package>/fail -> <package>
+    """
+    return [os.path.basename(os.path.dirname(_f))
+            for _f in fail_files.split()]
+
+
 def common_setup():
     """Common setup
 
@@ -246,6 +325,278 @@ def conf_proxies(docker_file):
         _file.writelines(data)
 
 
+def get_cache_path(name):
+    """Get the host path of a build cache
+
+    :param name: the name of the cache in BUILD_CACHES
+    :return: the path of the cache in the host
+    """
+    return os.path.join(BUILD_CACHE_PATH, name)
+
+
+def conf_cache_mounts(tb_file):
+    """Mount the build caches in the builder container
+
+    :param tb_file: the tb.sh script that launches the builder container
+    """
+
+    if not os.path.isfile(tb_file):
+        print('tb.sh file does not exists')
+        return
+
+    volumes = []
+    for name, cache in sorted(BUILD_CACHES.items()):
+        cache_path = get_cache_path(name)
+        if not os.path.isdir(cache_path):
+            os.makedirs(cache_path)
+        # the caches are written by root and mockbuild in the container
+        os.chmod(cache_path, 0o777)
+        volumes.append('-v {}:{}'.format(cache_path, cache['container_path']))
+    volumes = ' '.join(volumes)
+
+    with open(tb_file, 'r') as _file:
+        data = _file.read()
+
+    if volumes in data:
+        return
+    if 'docker run ' not in data:
+        print('the caches can not be mounted, docker run not found in: {}'
+              .format(tb_file))
+        return
+
+    print('mounting build caches in: {}'.format(os.path.basename(tb_file)))
+    data = data.replace('docker run ', 'docker run {} '.format(volumes), 1)
+
+    with open(tb_file, 'w') as _file:
+        _file.write(data)
+
+
+def conf_mock_caches():
+    """Configure mock to use the build caches
+
+    The mock configuration files of the chroots are loaded after
+    site-defaults.cfg, so they can still override these options
+    """
+
+    content = (
+        "config_opts['cache_topdir'] = '{}'\n"
+        "config_opts['plugin_conf']['ccache_enable'] = True\n"
+        "config_opts['plugin_conf']['ccache_opts']['dir'] = "
+        "'{}/u%(chrootuid)s/'\n"
+        "config_opts['plugin_conf']['ccache_opts']['max_cache_size'] = "
+        "'{}M'\n"
+        "config_opts['plugin_conf']['ccache_opts']['compress'] = True\n")\
+        .format(BUILD_CACHES['mock']['container_path'],
+                BUILD_CACHES['ccache']['container_path'],
+                max(BUILD_CACHES['ccache']['max_size'] // MB, 1))
+
+    # /localdisk in the container is work/localdisk in the host
+    with open('{}/work/localdisk/mock-caches.cfg'.format(
+            LOCAL_STX_TOOLS), 'w') as mock_caches:
+        mock_caches.write(content)
+
+    run_in_container('sudo sh -c \'cat /localdisk/mock-caches.cfg >> '
+                     '/etc/mock/site-defaults.cfg\'')
+
+
+def conf_yum_cache():
+    """Configure yum in the container to keep the downloaded packages
+
+    yum in CentOS 7 removes the packages after installing them (keepcache=0),
+    so the yum cache would only keep the metadata of the repositories
+    """
+
+    run_in_container('sudo sed -i -e \'/^keepcache=/d\' '
+                     '-e \'/^\\[main\\]/a keepcache=1\' /etc/yum.conf')
+
+
+def get_ccache_stats(cache_path):
+    """Get the hits and misses of a ccache cache
+
+    ccache keeps its counters in the stats files of the cache, one counter
+    per line, so they do not depend on the access times of the files. The
+    cache has a ccache directory for each chroot uid (see conf_mock_caches)
+    and ccache 3 only keeps the stats files in <dir>/stats and
+    <dir>/<hex>/stats, so the objects of the cache are not walked
+    :param cache_path: the path of the cache in the host
+    :return: a tuple with the hits and the misses of the cache
+    """
+    hits = 0
+    misses = 0
+    if not os.path.isdir(cache_path):
+        return hits, misses
+
+    stats_files = []
+    for ccache_dir in os.listdir(cache_path):
+        ccache_dir = os.path.join(cache_path, ccache_dir)
+        stats_files.append(os.path.join(ccache_dir, 'stats'))
+        stats_files.extend(os.path.join(ccache_dir, '{:x}'.format(number),
+                                        'stats') for number in range(16))
+
+    for stats_file in stats_files:
+        try:
+            with open(stats_file, 'r') as stats:
+                counters = [int(line) for line in stats.read().split()]
+        except (IOError, OSError, ValueError):
+            continue
+        counters += [0] * (CCACHE_DIRECT_HIT + 1 - len(counters))
+        hits += counters[CCACHE_PREPROCESSED_HIT] + counters[CCACHE_DIRECT_HIT]
+        misses += counters[CCACHE_MISS]
+
+    return hits, misses
+
+
+def get_root_cache_stats(start):
+    """Get the hits and misses of the mock root caches in a build step
+
+    mock writes its states in the state.log of each package in the results of
+    build-pkgs, a chroot restored from its root cache is a hit and a root cache
+    created is a miss
+    :param start: the time when the build step started
+    :return: a tuple with the hits and the misses of the root caches
+    """
+    hits = 0
+    misses = 0
+
+    for state_log in glob.glob('{}/work/localdisk/loadbuild/{}/{}/*/results/'
+                               '*/state.log'.format(LOCAL_STX_TOOLS, MYUNAME,
+                                                    PROJECT)):
+        try:
+            if os.stat(state_log).st_mtime < start:
+                continue
+            with open(state_log, 'r') as _file:
+                states = _file.read()
+        except (IOError, OSError):
+            continue
+        hits += states.count(ROOT_CACHE_HIT)
+        misses += states.count(ROOT_CACHE_MISS)
+
+    return hits, misses
+
+
+def get_yum_downloads(cache_path, start):
+    """Get the packages downloaded by yum in a build step
+
+    The packages of a repository are kept in <repository>/packages, the ones
+    modified since the start of the step were downloaded during the step. yum
+    does not log the packages installed from its cache, so only the downloads
+    can be counted
+    :param cache_path: the path of the yum cache in the host
+    :param start: the time when the build step started
+    :return: a tuple with the packages downloaded and all the packages cached
+    """
+    downloaded = 0
+    cached = 0
+
+    for package in glob.glob('{}/*/*/*/packages/*.rpm'.format(cache_path)):
+        try:
+            mtime = os.stat(package).st_mtime
+        except OSError:
+            continue
+        cached += 1
+        if mtime >= start:
+            downloaded += 1
+
+    return downloaded, cached
+
+
+def get_cache_units(cache_path, unit_depth):
+    """Get the units of a build cache
+
+    The last use of a unit is its newest access or modification time, with
+    the relatime mounts the access times are updated once a day, which is
+    enough to find the units not used for more time
+    :param cache_path: the path of the cache in the host
+    :param unit_depth: the depth of the folders that are the units
+    :return: a dict with the [size, last use, last modification] of each unit
+    """
+    units = {}
+
+    for root, _, files in os.walk(cache_path):
+        parts = os.path.relpath(root, cache_path).split(os.sep)
+        if parts == ['.'] or len(parts) < unit_depth:
+            continue
+        unit = units.setdefault(
+            os.path.join(cache_path, *parts[:unit_depth]), [0, 0, 0])
+        for _f in files:
+            try:
+                stat = os.lstat(os.path.join(root, _f))
+            except OSError:
+                continue
+            unit[0] += stat.st_size
+            unit[1] = max(unit[1], stat.st_atime, stat.st_mtime)
+            unit[2] = max(unit[2], stat.st_mtime)
+
+    return units
+
+
+def prune_cache(cache_path, max_size, unit_depth, units=None):
+    """Remove the least recently used units of a build cache
+
+    Whole units are removed, so a chroot or a repository is never left with
+    part of its files
+    :param cache_path: the path of the cache in the host
+    :param max_size: the maximum size in bytes allowed for the cache
+    :param unit_depth: the depth of the folders that are the units
+    :param units: the units of the cache from get_cache_units
+    """
+    if units is None:
+        units = get_cache_units(cache_path, unit_depth)
+
+    cache_size = sum(size for size, _, _ in units.values())
+    # the units not used for more time are removed first
+    for _, size, unit in sorted(
+            (last_use, size, unit)
+            for unit, (size, last_use, _) in units.items()):
+        if cache_size <= max_size:
+            break
+        rmtree(unit, ignore_errors=True)
+        cache_size -= size
+
+
+def run_build_step(cmd, stage):
+    """Run a build step in the container and report the use of the caches
+
+    The hits and misses of ccache are read from its stats files and the ones
+    of the mock root caches from the state logs of the packages, for yum the
+    packages downloaded during the step are reported. After the step the mock
+    and yum caches are pruned to their maximum size
+    :param cmd: the cmd of the build step
+    :param stage: the name of the stage to report
+    """
+    ccache_before = get_ccache_stats(get_cache_path('ccache'))
+    start = time.time()
+
+    run_in_container(cmd)
+
+    for name, cache in sorted(BUILD_CACHES.items()):
+        cache_path = get_cache_path(name)
+        if cache['unit_depth'] is None:
+            ccache_after = get_ccache_stats(cache_path)
+            hits = ccache_after[0] - ccache_before[0]
+            misses = ccache_after[1] - ccache_before[1]
+            rate = 100.0 * hits / (hits + misses) if hits + misses else 0.0
+            print('{} cache {}: {} hits, {} misses ({:.1f}%)'.format(
+                stage, name, hits, misses, rate))
+            continue
+
+        if name == 'mock':
+            hits, misses = get_root_cache_stats(start)
+            rate = 100.0 * hits / (hits + misses) if hits + misses else 0.0
+            print('{} cache {}: {} root cache hits, {} misses ({:.1f}%)'
+                  .format(stage, name, hits, misses, rate))
+        else:
+            downloaded, cached = get_yum_downloads(cache_path, start)
+            print('{} cache {}: {} packages downloaded, {} cached'.format(
+                stage, name, downloaded, cached))
+
+        units = get_cache_units(cache_path, cache['unit_depth'])
+        updated = len([unit for unit in units.values() if unit[2] >= start])
+        print('{} cache {}: {} units, {} updated'.format(
+            stage, name, len(units), updated))
+        prune_cache(cache_path, cache['max_size'], cache['unit_depth'], units)
+
+
 def create_containers():
     """Create docker containers"""
 
@@ -278,14 +629,23 @@ def setup_build_other_actions():
     All the others actions in order to setup build must be here
     """
 
-    # launch the container
+    # launch the container with the build caches
+    conf_cache_mounts('{}/tb.sh'.format(LOCAL_STX_TOOLS))
     bash('cd {} && bash tb.sh run'.format(LOCAL_STX_TOOLS))
+    conf_mock_caches()
+    conf_yum_cache()
     # copying file to container
     bash('docker cp {}/buildrc {}:/home/{}'.format(
         LOCAL_STX_TOOLS, TC_CONTAINER_NAME, CURRENT_USER))
     bash('docker cp {}/localrc {}:/home/{}'.format(
         LOCAL_STX_TOOLS, TC_CONTAINER_NAME, CURRENT_USER))
 
+    # /localdisk in the container is work/localdisk in the host
+    copyfile(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                     'build_logs.py'),
+        '{}/work/localdisk/build_logs.py'.format(LOCAL_STX_TOOLS))
+
     # copy cgcs-tis-repo
     if os.path.isdir('/var/opt/cgcs-tis-repo'):
         bash('docker cp /var/opt/cgcs-tis-repo {}:/home/{}'.format(
@@ -361,10 +721,10 @@ def build_srpms():
     cmd = ('''
     source \$HOME/.bashrc
     cd \$MY_REPO
-    time build-srpms | tee /localdisk/build-srpms.log
-    ''')
+    time build-srpms 2>&1 | {LOG_WRITER} /localdisk/build-srpms.log.gz
+    '''.format(LOG_WRITER=LOG_WRITER))
 
-    run_in_container(cmd)
+    run_build_step(cmd, 'build-srpms')
 
     path = '{}/work/localdisk/loadbuild/{}/{}/std/tmp'.format(
         LOCAL_STX_TOOLS, MYUNAME, PROJECT)
@@ -374,7 +734,8 @@ def build_srpms():
             if os.stat(os.path.join(path, _f)).st_size > 0:
                 slack_bot(
                     ':neutral_face: Build failed in stage `build-srpms` for '
-                    'branch `{}`'.format(BRANCH), _type='danger',
+                    'branch `{}`{}'.format(BRANCH, get_failure_excerpts(
+                        'build-srpms.log.gz')), _type='danger',
                     title='Check the logs here', title_link=BUILD_URL
                 )
                 # fail the current pipeline step
@@ -394,19 +755,21 @@ def build_std():
     cmd = ('''
     source \$HOME/.bashrc
     cd \$MY_REPO
-    time build-pkgs --std | tee /localdisk/build-pkgs_std.log
-    ''')
+    time build-pkgs --std 2>&1 | {LOG_WRITER} /localdisk/build-pkgs_std.log.gz
+    '''.format(LOG_WRITER=LOG_WRITER))
 
-    run_in_container(cmd)
+    run_build_step(cmd, 'build-pkgs --std')
 
     fail_files = bash(
         'find {}/work/localdisk/loadbuild/{}/{}/std/results -name fail'.format(
-            LOCAL_STX_TOOLS, MYUNAME, PROJECT)).stdout
+            LOCAL_STX_TOOLS, MYUNAME, PROJECT)).value()
 
     if fail_files:
         slack_bot(
             ':neutral_face: Build failed in stage `build-pkgs` for '
-            'branch `{}`'.format(BRANCH), _type='danger',
+            'branch `{}`{}'.format(BRANCH, get_failure_excerpts(
+                'build-pkgs_std.log.gz', get_failed_packages(fail_files))),
+            _type='danger',
             title='Check the logs here', title_link=BUILD_URL
         )
         # fail the current pipeline step
@@ -425,19 +788,21 @@ def build_rt():
     cmd = ('''
     source \$HOME/.bashrc
     cd \$MY_REPO
-    time build-pkgs --rt | tee /localdisk/build-pkgs_rt.log
-    ''')
+    time build-pkgs --rt 2>&1 | {LOG_WRITER} /localdisk/build-pkgs_rt.log.gz
+    '''.format(LOG_WRITER=LOG_WRITER))
 
-    run_in_container(cmd)
+    run_build_step(cmd, 'build-pkgs --rt')
 
     fail_files = bash(
         'find {}/work/localdisk/loadbuild/{}/{}/rt/results -name fail'.format(
-            LOCAL_STX_TOOLS, MYUNAME, PROJECT)).stdout
+            LOCAL_STX_TOOLS, MYUNAME, PROJECT)).value()
 
     if fail_files:
         slack_bot(
             ':neutral_face: Build failed in stage `build-pkgs --rt` for '
-            'branch `{}`'.format(BRANCH), _type='danger',
+            'branch `{}`{}'.format(BRANCH, get_failure_excerpts(
+                'build-pkgs_rt.log.gz', get_failed_packages(fail_files))),
+            _type='danger',
             title='Check the logs here', title_link=BUILD_URL
         )
         # fail the current pipeline step
@@ -456,19 +821,22 @@ def build_installer():
     cmd = ('''
     source \$HOME/.bashrc
     cd \$MY_REPO
-    time build-pkgs --installer | tee /localdisk/build-pkgs_installer.log
-    ''')
+    time build-pkgs --installer 2>&1 | {LOG_WRITER} \
+    /localdisk/build-pkgs_installer.log.gz
+    '''.format(LOG_WRITER=LOG_WRITER))
 
-    run_in_container(cmd)
+    run_build_step(cmd, 'build-pkgs --installer')
 
     fail_files = bash(
         'find {}/work/localdisk/loadbuild/{}/{}/installer/results -name '
-        'fail'.format(LOCAL_STX_TOOLS, MYUNAME, PROJECT)).stdout
+        'fail'.format(LOCAL_STX_TOOLS, MYUNAME, PROJECT)).value()
 
     if fail_files:
         slack_bot(
             ':neutral_face: Build failed in stage `build-pkgs --installer` '
-            'for branch `{}`'.format(BRANCH), _type='danger',
+            'for branch `{}`{}'.format(BRANCH, get_failure_excerpts(
+                'build-pkgs_installer.log.gz',
+                get_failed_packages(fail_files))), _type='danger',
             title='Check the logs here', title_link=BUILD_URL
         )
         # fail the current pipeline step
@@ -495,10 +863,10 @@ def build_iso():
     cmd = ('''
     source \$HOME/.bashrc
     cd \$MY_REPO
-    time build-iso | tee /localdisk/build-iso.log
-    ''')
+    time build-iso 2>&1 | {LOG_WRITER} /localdisk/build-iso.log.gz
+    '''.format(LOG_WRITER=LOG_WRITER))
 
-    run_in_container(cmd)
+    run_build_step(cmd, 'build-iso')
 
     iso_file = '{}/work/localdisk/loadbuild/{}/{}/export/bootimage.iso'.format(
         LOCAL_STX_TOOLS, MYUNAME, PROJECT)
@@ -506,7 +874,8 @@ def build_iso():
     if not os.path.isfile(iso_file):
         slack_bot(
             ':neutral_face: Build failed in stage `build-iso` for branch '
-            '`{}`'.format(BRANCH), _type='danger',
+            '`{}`{}'.format(BRANCH, get_failure_excerpts(
+                'build-iso.log.gz')), _type='danger',
             title='Check the logs here', title_link=BUILD_URL
         )
         # fail the current pipeline step
@@ -540,10 +909,11 @@ def build_init_files():
     cmd = ('''
     source \$HOME/.bashrc
     cd \$MY_REPO
-    time update-pxe-network-installer | tee /localdisk/build_init_files.log
-    ''')
+    time update-pxe-network-installer 2>&1 | {LOG_WRITER} \
+    /localdisk/build_init_files.log.gz
+    '''.format(LOG_WRITER=LOG_WRITER))
 
-    run_in_container(cmd)
+    run_build_step(cmd, 'update-pxe-network-installer')
 
     # check if the init files were correctly generated
     init_files = ['new-initrd.img', 'new-squashfs.img', 'new-vmlinuz']
@@ -0,0 +1,263 @@
+"""Capture and query the logs of the StarlingX build steps
+
+The output of a build step is compressed on the fly into frames, each frame
+is an independent gzip member so the log is still a valid gzip file (zcat,
+zgrep and zless work) and any frame can be decompressed without reading the
+previous ones.
+
+A side index (<log>.idx) has a json line for each frame with its offsets and
+a json line for each error/failure line with its offset and the package that
+was being built, so the excerpt of a failure is extracted instantly.
+
+This module runs inside the builder container as well, so it must work with
+the python of the container:
+    time build-pkgs --std 2>&1 | python build_logs.py write build-pkgs.log.gz
+    python build_logs.py query build-pkgs.log.gz --package <package>
+"""
+from __future__ import print_function
+
+import argparse
+import collections
+import json
+import re
+import sys
+import time
+import zlib
+
+# a frame is written when it reaches FRAME_SIZE bytes or FRAME_SECONDS
+FRAME_SIZE = 1024 * 1024
+FRAME_SECONDS = 30
+# the maximum number of error/failure lines of each package in the index, the
+# first and the last MAX_HITS lines of each package are kept
+MAX_HITS = 1000
+# the lines that are indexed as errors/failures
+ERROR_PATTERN = re.compile(r'\b(error|failed|failure|fatal)\b', re.IGNORECASE)
+# the package being built is the last source rpm in the log
+PACKAGE_PATTERN = re.compile(r'([\w.+-]+)\.src\.rpm')
+
+
+def write_frame(log, index, data, offset):
+    """Compress a frame into the log and save its offsets in the index
+
+    :param log: the compressed log opened in binary mode
+    :param index: the index of the log
+    :param data: the uncompressed data of the frame
+    :param offset: the uncompressed offset of the frame in the log
+    """
+    # wbits 31 means a gzip member
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    frame = compressor.compress(data) + compressor.flush()
+    start = log.tell()
+    log.write(frame)
+    log.flush()
+    index.write('{}\n'.format(json.dumps(
+        {'frame': [start, len(frame), offset, len(data)]})))
+    index.flush()
+
+
+def write_hits(index, hits):
+    """Save the error/failure lines in the index
+
+    :param index: the index of the log
+    :param hits: a list of dicts with the uncompressed offset (hit), the
+                 package and the line of each error/failure line
+    """
+    for hit in hits:
+        index.write('{}\n'.format(json.dumps(hit)))
+
+
+def write(log_path, stream=None, echo=None):
+    """Compress a stream into a log and build its index
+
+    The stream is echoed as it is read, like tee
+    :param log_path: the compressed log
+    :param stream: the stream to read, by default the stdin
+    :param echo: the stream to echo, by default the stdout
+    """
+    stream = stream or getattr(sys.stdin, 'buffer', sys.stdin)
+    echo = echo or getattr(sys.stdout, 'buffer', sys.stdout)
+    frame = []
+    frame_size = 0
+    frame_time = time.time()
+    offset = 0
+    # the error/failure lines indexed of each package
+    hits = {}
+    # the last error/failure lines of the package after the first MAX_HITS
+    last_hits = collections.deque(maxlen=MAX_HITS)
+    package = None
+
+    with open(log_path, 'wb') as log, \
+            open('{}.idx'.format(log_path), 'w') as index:
+        for line in iter(stream.readline, b''):
+            echo.write(line)
+            echo.flush()
+
+            text = line.decode('utf-8', 'replace')
+            match = PACKAGE_PATTERN.search(text)
+            if match and match.group(1) != package:
+                write_hits(index, last_hits)
+                last_hits.clear()
+                package = match.group(1)
+            if ERROR_PATTERN.search(text):
+                hit = {'hit': offset + frame_size, 'package': package,
+                       'line': text.strip()[:200]}
+                if hits.get(package, 0) < MAX_HITS:
+                    write_hits(index, [hit])
+                    hits[package] = hits.get(package, 0) + 1
+                else:
+                    last_hits.append(hit)
+
+            frame.append(line)
+            frame_size += len(line)
+            if frame_size >= FRAME_SIZE or \
+                    time.time() - frame_time >= FRAME_SECONDS:
+                write_frame(log, index, b''.join(frame), offset)
+                offset += frame_size
+                frame = []
+                frame_size = 0
+                frame_time = time.time()
+
+        if frame:
+            write_frame(log, index, b''.join(frame), offset)
+        write_hits(index, last_hits)
+
+
+def read_index(log_path):
+    """Read the index of a log
+
+    :param log_path: the compressed log
+    :return:
+        - frames: a list of (compressed offset, compressed size, uncompressed
+                  offset, uncompressed size) of each frame
+        - hits: a list of dicts with the uncompressed offset (hit), the
+                package and the line of each error/failure line
+    """
+    frames = []
+    hits = []
+
+    with open('{}.idx'.format(log_path), 'r') as index:
+        for line in index:
+            entry = json.loads(line)
+            if 'frame' in entry:
+                frames.append(entry['frame'])
+            else:
+                hits.append(entry)
+
+    # the last hits of a package are written when the next package starts
+    hits.sort(key=lambda hit: hit['hit'])
+
+    return frames, hits
+
+
+def read_frames(log_path, frames):
+    """Decompress some frames of a log
+
+    :param log_path: the compressed log
+    :param frames: the consecutive frames to decompress from read_index
+    :return: the uncompressed data of the frames
+    """
+    data = []
+
+    with open(log_path, 'rb') as log:
+        for start, size, _, _ in frames:
+            log.seek(start)
+            data.append(zlib.decompress(log.read(size), 31))
+
+    return b''.join(data)
+
+
+def query(log_path, packages=None, context=5, max_hits=3):
+    """Get the excerpts of the error/failure lines of a log
+
+    :param log_path: the compressed log
+    :param packages: the packages to get the excerpts, all if None
+    :param context: the lines before and after each error/failure line
+    :param max_hits: the maximum number of excerpts of each package, the last
+                     error/failure lines of each package are taken since the
+                     failure is usually at the end of its build
+    :return: a list of (package, excerpt) ordered as they are in the log
+    """
+    frames, hits = read_index(log_path)
+    excerpts = []
+    count = {}
+
+    for hit in reversed(hits):
+        package = hit['package']
+        if packages is not None and package not in packages:
+            continue
+        if count.get(package, 0) >= max_hits:
+            continue
+        count[package] = count.get(package, 0) + 1
+
+        # the frame of the hit and its neighbours for the context lines
+        position = [i for i, frame in enumerate(frames)
+                    if frame[2] <= hit['hit'] < frame[2] + frame[3]]
+        if not position:
+            # the frame was not written, e.g: the build was killed
+            continue
+        first = max(position[0] - 1, 0)
+        last = min(position[0] + 2, len(frames))
+        data = read_frames(log_path, frames[first:last])
+
+        hit_offset = hit['hit'] - frames[first][2]
+        before = data[:hit_offset].split(b'\n')[:-1]
+        before = before[max(len(before) - context, 0):]
+        # the hit is the first line of after
+        after = data[hit_offset:].split(b'\n')[:context + 1]
+        excerpt = b'\n'.join(before + after).decode('utf-8', 'replace')
+        excerpts.append((package, excerpt))
+
+    excerpts.reverse()
+
+    return excerpts
+
+
+def arguments():
+    """Define and handle arguments with options to run the script
+
+    Return:
+     - parser.parse_args(): list arguments as objects assigned as attributes
+       of a namespace
+    """
+
+    description = 'Script used to capture and query the build logs'
+    parser = argparse.ArgumentParser(description=description)
+    subparsers = parser.add_subparsers(dest='command')
+    write_parser = subparsers.add_parser(
+        'write', help='compress the stdin into a log')
+    write_parser.add_argument('log', help='the compressed log')
+    query_parser = subparsers.add_parser(
+        'query', help='show the excerpts of the error/failure lines')
+    query_parser.add_argument('log', help='the compressed log')
+    query_parser.add_argument(
+        '--package', dest='packages', action='append',
+        help='the package to show, it can be used several times')
+    query_parser.add_argument(
+        '--context', dest='context', type=int, default=5,
+        help='the lines before and after each error/failure line')
+    query_parser.add_argument(
+        '--max', dest='max_hits', type=int, default=3,
+        help='the maximum number of excerpts of each package, the last ones')
+    query_parser.add_argument(
+        '--list', dest='list', action='store_true',
+        help='list the packages with error/failure lines')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    ARGS = arguments()
+
+    if ARGS.command == 'write':
+        write(ARGS.log)
+    elif ARGS.list:
+        PACKAGES = {}
+        for HIT in read_index(ARGS.log)[1]:
+            PACKAGES[HIT['package']] = PACKAGES.get(HIT['package'], 0) + 1
+        for PACKAGE, HITS in sorted(PACKAGES.items(), key=str):
+            print('{}: {}'.format(PACKAGE, HITS))
+    else:
+        for PACKAGE, EXCERPT in query(ARGS.log, ARGS.packages, ARGS.context,
+                                      ARGS.max_hits):
+            print('----- {} -----'.format(PACKAGE))
+            print(EXCERPT)
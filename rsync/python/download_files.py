@@ -14,6 +14,22 @@ RSYNC_CMD = '-avzhe'
 SSH_CMD = 'ssh -o StrictHostKeyChecking=no'
 
 
+def download_iso(iso, folder, verbose=False):
+    """Download a starlingx ISO
+
+    :param iso: the name of the iso in the server
+    :param folder: the folder where the iso will be downloading
+    :param verbose: show the progress of rsync command
+    """
+
+    progress = '--progress' if verbose else ''
+    print('Downloading: {} ...'.format(iso))
+    cmd = ('rsync {} "{}" {} {}@{}:{}/{} {}'.format(
+        RSYNC_CMD, SSH_CMD, progress, SERVER_USER, SERVER_IP,
+        SERVER_FOLDER, iso, folder))
+    os.system(cmd)
+
+
 def download_isos(number, folder, verbose=False):
     """Download starlingx ISOS
 
@@ -22,7 +38,6 @@ def download_isos(number, folder, verbose=False):
     :param verbose: show the progress of rsync command
     """
 
-    progress = '--progress' if verbose else ''
     ssh_cmd = ('ssh -XC {}@{} "ls {} | grep -E \"^stx\" | grep -E \"\.iso$\" '
                '| grep -iv \"**centos**\" "')\
         .format(SERVER_USER, SERVER_IP, SERVER_FOLDER)
@@ -37,11 +52,7 @@ def download_isos(number, folder, verbose=False):
 
     for iso in isos_to_download:
         if not os.path.isfile('{}/{}'.format(folder, iso)):
-            print('Downloading: {} ...'.format(iso))
-            cmd = ('rsync {} "{}" {} {}@{}:{}/{} {}'.format(
-                RSYNC_CMD, SSH_CMD, progress, SERVER_USER, SERVER_IP,
-                SERVER_FOLDER, iso, folder))
-            os.system(cmd)
+            download_iso(iso, folder, verbose)
 
 
 def evaluate_args(args):
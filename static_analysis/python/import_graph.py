@@ -0,0 +1,201 @@
+"""Keep the import graph of the python modules of a repository
+
+The imports of each module are persisted in a json file by git blob sha, so
+only the modules changed since the last run are parsed again
+"""
+from __future__ import print_function
+
+import ast
+import hashlib
+import json
+import os
+import tempfile
+
+from bash import bash
+
+
+def get_tree_blobs(repository, revision='HEAD'):
+    """Get the git blob sha of the python files in a revision
+
+    :param repository: the repository to get the files from
+    :param revision: the git revision to get the files from
+    :return: a dict with the blob sha of each python file
+    """
+    blobs = {}
+    tree = bash('git -C {} ls-tree -r {}'.format(
+        repository, revision)).value().splitlines()
+
+    for line in tree:
+        # <mode> <type> <sha>\t<path>
+        info, path = line.split('\t', 1)
+        if path.endswith('.py'):
+            blobs[path] = info.split()[2]
+
+    return blobs
+
+
+def get_module_name(path):
+    """Get the module name of a python file
+
+    :param path: the python file (relative to the repository)
+    :return: the dotted name of the module, e.g: a/b/c.py -> a.b.c
+    """
+    name = os.path.splitext(path)[0].replace(os.sep, '.')
+    if name.endswith('.__init__'):
+        name = name[:-len('.__init__')]
+
+    return name
+
+
+def get_blob_sources(repository, blobs):
+    """Get the content of some git blobs
+
+    :param repository: the repository where the blobs are
+    :param blobs: the blob shas
+    :return: a dict with the content of each blob
+    """
+    sources = {}
+    if not blobs:
+        return sources
+
+    descriptor, blob_list = tempfile.mkstemp(suffix='.txt')
+    with os.fdopen(descriptor, 'w') as _file:
+        _file.write('{}\n'.format('\n'.join(blobs)))
+    try:
+        output = bash('git -C {} cat-file --batch < {}'.format(
+            repository, blob_list)).stdout or b''
+    finally:
+        os.remove(blob_list)
+
+    # <sha> blob <size>\n<content>\n for each blob
+    position = 0
+    while position < len(output):
+        end = output.index(b'\n', position)
+        header = output[position:end].split()
+        position = end + 1
+        if header[1] == b'missing':
+            continue
+        size = int(header[2])
+        sources[header[0].decode('utf-8')] = output[position:position + size]
+        position += size + 1
+
+    return sources
+
+
+def get_imports(path, source):
+    """Get the names imported by a python file
+
+    :param path: the python file (relative to the repository)
+    :param source: the content of the python file
+    :return: the dotted names imported by the python file, for the statements
+             like "from a import b" both "a.b" and "a" are returned since b
+             could be a module or an attribute of a
+    """
+    try:
+        tree = ast.parse(source, filename=path)
+    except (SyntaxError, ValueError):
+        return []
+
+    package = get_module_name(path).split('.')
+    if not path.endswith('__init__.py'):
+        package = package[:-1]
+
+    imports = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                # relative import
+                base = package[:len(package) - node.level + 1]
+                if node.module:
+                    base = base + node.module.split('.')
+                module = '.'.join(base)
+            else:
+                module = node.module
+            if module:
+                imports.add(module)
+            imports.update('.'.join(filter(None, [module, alias.name]))
+                           for alias in node.names if alias.name != '*')
+
+    return sorted(imports)
+
+
+def get_graph_file(cache_dir, repository):
+    """Get the json file where the import graph of a repository is persisted
+
+    :param cache_dir: the folder where the import graph is persisted
+    :param repository: the repository of the import graph
+    :return: the path of the json file
+    """
+    name = hashlib.sha1(os.path.abspath(repository).encode('utf-8'))
+
+    return os.path.join(cache_dir, 'import_graph_{}.json'.format(
+        name.hexdigest()))
+
+
+def build_graph(repository, cache_dir, revision='HEAD'):
+    """Build the import graph of a repository
+
+    :param repository: the repository to build the import graph
+    :param cache_dir: the folder where the import graph is persisted
+    :param revision: the git revision of the import graph, the graph of the
+                     last revision is persisted
+    :return: a dict with the python files imported by each python file
+    """
+    graph_file = get_graph_file(cache_dir, repository)
+    files = {}
+    if os.path.isfile(graph_file):
+        with open(graph_file, 'r') as _file:
+            files = json.load(_file)
+
+    blobs = get_tree_blobs(repository, revision)
+    # the files are read from git, so any revision can be used
+    changed = [path for path, blob in blobs.items()
+               if path not in files or files[path]['blob'] != blob]
+    sources = get_blob_sources(
+        repository, sorted(set(blobs[path] for path in changed)))
+    for path in changed:
+        files[path] = {'blob': blobs[path], 'imports': get_imports(
+            path, sources.get(blobs[path], b''))}
+    # removing the deleted files
+    for path in set(files) - set(blobs):
+        files.pop(path)
+
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    # renamed into place, so an interrupted run does not truncate the graph
+    descriptor, temporary = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as _file:
+        json.dump(files, _file)
+    os.rename(temporary, graph_file)
+
+    # the root of the python path is unknown, so the modules are indexed by
+    # every suffix of their names, e.g: a.b.c -> c, b.c, a.b.c
+    index = {}
+    for path in files:
+        parts = get_module_name(path).split('.')
+        for i in range(len(parts)):
+            index.setdefault('.'.join(parts[i:]), set()).add(path)
+
+    graph = {}
+    for path, info in files.items():
+        graph[path] = set()
+        for name in info['imports']:
+            graph[path].update(index.get(name, set()) - {path})
+
+    return graph
+
+
+def get_reverse_dependencies(graph, paths):
+    """Get the python files that import some of the given python files
+
+    :param graph: the import graph from build_graph
+    :param paths: the python files (relatives to the repository)
+    :return: the python files that import some of the paths, excluding the
+             paths themselves
+    """
+    paths = set(paths)
+
+    return sorted(path for path, imports in graph.items()
+                  if imports & paths and path not in paths)
@@ -0,0 +1,59 @@
+"""pylint reporter with the messages and the statements of each module
+
+The score of each python file is calculated with the number of statements
+counted by pylint itself, since the json reporter of pylint only outputs the
+messages. The output is a json object:
+    {"messages": [<json reporter messages>], "statements": {"a.py": 10}}
+
+It is used by run_analysis.py with:
+    pylint --output-format=json_stats_reporter.JSONStatsReporter
+and by lint_server.py in process
+"""
+from __future__ import print_function
+
+import io
+import json
+import os
+
+try:
+    from pylint.reporters.json_reporter import JSONReporter
+except ImportError:
+    from pylint.reporters.json import JSONReporter
+
+
+class JSONStatsReporter(JSONReporter):
+    """Report the messages and the statements of each module in json"""
+
+    name = 'json-stats'
+
+    def __init__(self, output=None):
+        super(JSONStatsReporter, self).__init__(output)
+        # the path of each module name
+        self.paths = {}
+
+    def on_set_current_module(self, module, filepath):
+        """Save the path of the module being analyzed"""
+        super(JSONStatsReporter, self).on_set_current_module(module, filepath)
+        if filepath:
+            self.paths[module] = os.path.normpath(os.path.relpath(filepath))
+
+    def display_messages(self, layout):
+        """The messages are written when pylint closes, with the stats"""
+
+    def on_close(self, stats, previous_stats):
+        """Write the messages and the statements of each module"""
+        output = self.out
+        self.out = io.StringIO()
+        JSONReporter.display_messages(self, None)
+        messages = self.out.getvalue()
+        self.out = output
+
+        # LinterStats in pylint >= 2.12, a dict before
+        by_module = stats['by_module'] if isinstance(stats, dict) \
+            else stats.by_module
+        statements = dict(
+            (path, by_module.get(module, {}).get('statement', 0))
+            for module, path in self.paths.items())
+
+        print(json.dumps({'messages': json.loads(messages) if messages else [],
+                          'statements': statements}), file=self.out)
@@ -0,0 +1,253 @@
+"""Keep pylint warm in memory to serve static analysis requests
+
+This module runs a local server that lints python modules in process, so the
+interpreter, pylint and the astroid trees of the imported dependencies are
+loaded only once and reused between requests.
+
+The requests are received over a unix socket as a json line:
+    {"version": "<sha1>", "repository": "/path/to/repository",
+     "files": ["a.py", "b/c.py"]}
+and the response is a json line with the score and the messages of each file.
+The requests of other versions of the scripts or pylint are refused (see
+run_analysis.get_lint_server_version), a request without files is a ping.
+"""
+from __future__ import print_function
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import signal
+import sys
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+from astroid import MANAGER
+from pylint.lint import Run
+
+from json_stats_reporter import JSONStatsReporter
+from run_analysis import LINT_SERVER_SOCKET
+from run_analysis import get_lint_server_version
+from run_analysis import get_results
+from run_analysis import send_to_server
+
+# seconds to wait for the answer of a ping
+PING_TIMEOUT = 10
+# (mtime, sha1) of the modules cached by astroid
+FINGERPRINTS = {}
+
+
+def get_fingerprint(file_path):
+    """Get the fingerprint of a file
+
+    :param file_path: the file to get the fingerprint
+    :return: a tuple with the mtime and the sha1 of the file or None if the
+             file does not exists
+    """
+    try:
+        mtime = os.stat(file_path).st_mtime
+        with open(file_path, 'rb') as _file:
+            sha = hashlib.sha1(_file.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+
+    return mtime, sha
+
+
+def track_modules():
+    """Save the fingerprint of the new modules in the astroid cache"""
+    for module in list(MANAGER.astroid_cache.values()):
+        file_path = getattr(module, 'file', None)
+        if file_path and file_path.endswith('.py') and \
+                file_path not in FINGERPRINTS:
+            FINGERPRINTS[file_path] = get_fingerprint(file_path)
+
+
+def invalidate_modules():
+    """Remove from the astroid cache the modules changed on disk
+
+    The sha1 of a module is only calculated when its mtime changed, this way a
+    fresh clone of the repository does not invalidate the unchanged modules
+    """
+    stale_modules = []
+
+    for name, module in list(MANAGER.astroid_cache.items()):
+        file_path = getattr(module, 'file', None)
+        if not file_path or not file_path.endswith('.py'):
+            continue
+
+        fingerprint = FINGERPRINTS.get(file_path)
+        if fingerprint is None:
+            stale_modules.append(name)
+            continue
+
+        try:
+            mtime = os.stat(file_path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == fingerprint[0]:
+            continue
+
+        new_fingerprint = get_fingerprint(file_path)
+        if new_fingerprint and new_fingerprint[1] == fingerprint[1]:
+            FINGERPRINTS[file_path] = new_fingerprint
+            continue
+
+        stale_modules.append(name)
+        FINGERPRINTS.pop(file_path, None)
+
+    for name in stale_modules:
+        MANAGER.astroid_cache.pop(name, None)
+
+    if stale_modules:
+        # the inference caches hold references to the nodes of the removed
+        # modules
+        # pylint: disable=import-outside-toplevel
+        try:
+            from astroid.context import _invalidate_cache
+            from astroid.inference_tip import clear_inference_tip_cache
+            from pylint.checkers.clear_lru_cache import clear_lru_caches
+        except ImportError:
+            # older versions, everything is parsed again
+            MANAGER.clear_cache()
+        else:
+            _invalidate_cache()
+            clear_inference_tip_cache()
+            clear_lru_caches()
+
+
+def lint(repository, python_files, jobs):
+    """Lint the python files with the pylint loaded in this process
+
+    :param repository: the repository where the python files are
+    :param python_files: the python files (relatives to the repository)
+    :param jobs: the number of processes used by pylint
+    :return: a dict with the score and the messages of each python file
+    """
+    invalidate_modules()
+
+    pylint_config = os.path.join(repository, '.pylintrc')
+    pylint_args = ['--rcfile={}'.format(pylint_config),
+                   '--jobs={}'.format(jobs), '--score=no', '--reports=no']
+    output = io.StringIO()
+
+    # pylint reports the paths relatives to the current directory
+    os.chdir(repository)
+    try:
+        Run(pylint_args + python_files,
+            reporter=JSONStatsReporter(output), exit=False)
+    except SystemExit:
+        # pylint exits when the configuration is not valid
+        pass
+    track_modules()
+
+    output = output.getvalue()
+    if not output:
+        # the client runs pylint in a new process to report the error
+        raise RuntimeError('pylint did not report any result')
+
+    return get_results(python_files, json.loads(output))
+
+
+class LintHandler(socketserver.StreamRequestHandler):
+    """Handle the requests to lint python files"""
+
+    def handle(self):
+        request = json.loads(self.rfile.readline().decode('utf-8'))
+
+        if request.get('version') != self.server.version:
+            # the scripts or pylint changed since the server was started
+            response = {'error': 'the lint server is outdated, version {}'
+                                 .format(self.server.version)}
+        elif 'files' not in request:
+            # ping
+            response = {'version': self.server.version}
+        else:
+            try:
+                response = lint(request['repository'], request['files'],
+                                self.server.jobs)
+            except Exception as error:  # pylint: disable=broad-except
+                response = {'error': str(error)}
+
+        self.wfile.write('{}\n'.format(json.dumps(response)).encode('utf-8'))
+
+
+def ping(socket_path):
+    """Check that the lint server is running with the current version
+
+    :param socket_path: the unix socket of the lint server
+    :return: True if the lint server answered and it is not outdated
+    """
+    return send_to_server({}, socket_path, PING_TIMEOUT) is not None
+
+
+def stop(signum, frame):  # pylint: disable=unused-argument
+    """Stop the server when it is killed, so serve removes its files"""
+    raise SystemExit(0)
+
+
+def serve(socket_path, jobs):
+    """Serve the lint requests until the process is killed
+
+    The pid of the server is written in <socket_path>.pid to stop it when it
+    is outdated or it does not answer, the socket and the pid file are
+    removed when the server is stopped with SIGTERM
+    :param socket_path: the unix socket where the requests are received
+    :param jobs: the number of processes used by pylint
+    """
+    if os.path.exists(socket_path):
+        # a socket from a previous server that was killed
+        os.remove(socket_path)
+
+    server = socketserver.UnixStreamServer(socket_path, LintHandler)
+    server.jobs = jobs
+    # the version of the scripts and pylint loaded in memory
+    server.version = get_lint_server_version()
+    with open('{}.pid'.format(socket_path), 'w') as pid_file:
+        pid_file.write(str(os.getpid()))
+    print('lint server listening on: {}, version {}'.format(
+        socket_path, server.version))
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+        os.remove('{}.pid'.format(socket_path))
+
+
+def arguments():
+    """Define and handle arguments with options to run the script
+
+    Return:
+     - parser.parse_args(): list arguments as objects assigned as attributes
+       of a namespace
+    """
+
+    description = 'Server used to run static analysis over python files'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '--socket', dest='socket', default=LINT_SERVER_SOCKET,
+        help='the unix socket where the requests are received')
+    parser.add_argument(
+        '--jobs', dest='jobs', type=int, default=1,
+        help='the number of processes used by pylint, the modules parsed in '
+             'the child processes are not kept in the server memory')
+    parser.add_argument(
+        '--ping', dest='ping', action='store_true',
+        help='exit with 0 if the lint server is running with the current '
+             'version of the scripts and pylint, 1 otherwise')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    ARGS = arguments()
+    if ARGS.ping:
+        sys.exit(0 if ping(ARGS.socket) else 1)
+    serve(ARGS.socket, ARGS.jobs)
@@ -4,71 +4,885 @@ This module works together with a change in Gerrit Code Review
 """
 from __future__ import print_function
 
-import sys
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
+import re
+import shutil
+import socket
+import tempfile
+from xml.etree import ElementTree
 
 from bash import bash
 
+from import_graph import build_graph
+from import_graph import get_reverse_dependencies
+
 MINIMUM_SCORE_PER_FILE = 9
 VERDICT = '/tmp/VERDICT'
+# the merged results of all the linters
+REPORT_JSON = '/tmp/static_analysis.json'
+REPORT_CHECKSTYLE = '/tmp/static_analysis.xml'
+LINTERS = ['pylint', 'flake8', 'shellcheck']
+# checkstyle severity of the types of messages of the linters
+SEVERITIES = {'fatal': 'error', 'error': 'error', 'warning': 'warning'}
+# the results of pylint are cached between patchsets by git blob sha
+CACHE_DIR = os.environ.get('STATIC_ANALYSIS_CACHE', os.path.join(
+    os.path.expanduser('~'), '.cache', 'static_analysis'))
+CACHE_MAX_SIZE = int(os.environ.get(
+    'STATIC_ANALYSIS_CACHE_SIZE', 100 * 1024 * 1024))
+# increased when the format or the scores of the cached results change
+CACHE_VERSION = '4'
+# the lint server (lint_server.py) keeps pylint warm between runs
+LINT_SERVER_SOCKET = os.environ.get(
+    'LINT_SERVER_SOCKET', '/tmp/lint_server.sock')
+# seconds to wait for the lint server before running pylint in a new process
+LINT_SERVER_TIMEOUT = int(os.environ.get('LINT_SERVER_TIMEOUT', 120))
+# the scripts loaded by the lint server, a change in them restarts it
+LINT_SERVER_SCRIPTS = ['lint_server.py', 'run_analysis.py',
+                       'json_stats_reporter.py']
+# the output of pylint --version, see get_pylint_version
+PYLINT_VERSION = None
+# the reporter with the statements of each module for the scores
+PYLINT_REPORTER = 'json_stats_reporter.JSONStatsReporter'
+
+
+def get_diff_cmd(repository, commit_range=None):
+    """Get the git command to get the differences of a change
+
+    :param repository: the repository of the change
+    :param commit_range: the commits of the change (e.g: HEAD~3..HEAD), if it
+                         is not provided the HEAD commit is used
+    :return: the git command without the output options
+    """
+    if commit_range:
+        return 'git -C {} diff {}'.format(repository, commit_range)
+
+    sha = bash('git -C {} rev-parse HEAD'.format(repository)).value()
+    return 'git -C {} diff-tree --no-commit-id -r {}'.format(repository, sha)
+
+
+def check_commit_range(repository, commit_range=None):
+    """Check that a commit range ends in the checked out revision
+
+    The files of the change are linted from the working tree and the import
+    graph is built from HEAD, so the messages would be matched with the
+    lines of other revision
+    :param repository: the repository of the change
+    :param commit_range: the commits of the change (e.g: HEAD~3..HEAD), a
+                         single revision is compared with the working tree
+    :raise ValueError: if the end of the commit range is not HEAD
+    """
+    if not commit_range or '..' not in commit_range:
+        return
+
+    end = re.split(r'\.\.\.?', commit_range, 1)[1] or 'HEAD'
+    end_sha = bash('git -C {} rev-parse --verify -q {}^{{commit}}'.format(
+        repository, end)).value()
+    head_sha = bash('git -C {} rev-parse HEAD'.format(repository)).value()
+
+    if end_sha != head_sha:
+        raise ValueError(
+            'the range {} does not end in HEAD ({}), check out {} to analyze '
+            'it'.format(commit_range, head_sha, end))
+
+
+def get_changed_files(repository, commit_range=None):
+    """Get the files of a change in the repository
+
+    :param repository: the repository to get the files from
+    :param commit_range: the commits of the change, if it is not provided the
+                         HEAD commit is used
+    :return: the files (relatives to the repository) that were added or
+             modified in the change, deleted files are not included
+    """
+    git_files = bash('{} --name-only'.format(
+        get_diff_cmd(repository, commit_range))).value().split()
+
+    return [f for f in git_files
+            if os.path.isfile(os.path.join(repository, f))]
+
+
+def get_deleted_files(repository, commit_range=None):
+    """Get the python files deleted or renamed in a change
+
+    :param repository: the repository to get the files from
+    :param commit_range: the commits of the change, if it is not provided the
+                         HEAD commit is used
+    :return: the python files (relatives to the repository) that were deleted
+             in the change, the renamed files are included with their old
+             path
+    """
+    git_files = bash('{} --name-only --no-renames --diff-filter=D'.format(
+        get_diff_cmd(repository, commit_range))).value().split()
+
+    return [f for f in git_files if f.endswith('.py')]
+
+
+def get_changed_lines(repository, git_files, commit_range=None):
+    """Get the lines added or modified in the files of a change
+
+    :param repository: the repository to get the lines from
+    :param git_files: the files (relatives to the repository)
+    :param commit_range: the commits of the change, if it is not provided the
+                         HEAD commit is used
+    :return: a dict with the set of changed line numbers of each file
+    """
+    diff = bash('{} -p -U0 --no-color -- {}'.format(
+        get_diff_cmd(repository, commit_range),
+        ' '.join(git_files))).value()
+
+    changed_lines = dict((git_file, set()) for git_file in git_files)
+    git_file = None
+    for line in diff.splitlines():
+        if line.startswith('+++ '):
+            git_file = line[len('+++ b/'):]
+        elif line.startswith('@@') and git_file in changed_lines:
+            # @@ -<start>[,<count>] +<start>[,<count>] @@
+            hunk = re.match(r'@@ -\S+ \+(\d+)(?:,(\d+))? @@', line)
+            start = int(hunk.group(1))
+            count = int(hunk.group(2)) if hunk.group(2) else 1
+            changed_lines[git_file].update(range(start, start + count))
+
+    return changed_lines
+
+
+def get_score(messages, statements):
+    """Calculate the score of a python module
+
+    This function uses the same evaluation expression than pylint:
+    10.0 - ((float(5 * error + warning + refactor + convention) / statement)
+    * 10)
+    :param messages: the pylint messages (json format) of the module
+    :param statements: the number of statements of the module
+    :return: the score of the module
+    """
+    types = [message['type'] for message in messages]
+
+    if 'fatal' in types or not statements:
+        return 0.0
+
+    penalty = (5 * types.count('error') + types.count('warning') +
+               types.count('refactor') + types.count('convention'))
+
+    return round(max(0.0, 10.0 - (float(penalty) / statements) * 10), 2)
+
+
+def get_process_error(linter, process):
+    """Get the error of a linter that did not finish
+
+    :param linter: one of LINTERS
+    :param process: the bash process of the linter
+    :return: the exit code and the last line of the stderr of the linter
+    """
+    stderr = process.stderr.decode('utf-8', 'replace').strip()
+    print('{} failed with exit code {}: {}'.format(
+        linter, process.code, stderr))
+
+    return '{} failed with exit code {}: {}'.format(
+        linter, process.code,
+        stderr.splitlines()[-1] if stderr else 'no output')
+
+
+def get_linter_errors(git_files, error):
+    """Get the messages for the files of a linter that did not finish
+
+    :param git_files: the files (relatives to the repository) of the linter
+    :param error: the error of the linter, see get_process_error
+    :return: a fatal message for each file, so the files do not pass without
+             being analyzed
+    """
+    return [{'type': 'fatal', 'path': git_file, 'line': 0, 'column': 0,
+             'symbol': 'linter-error', 'message': error}
+            for git_file in git_files]
+
+
+def has_linter_error(results):
+    """Check if the results of a file come from a linter that did not finish
+
+    :param results: the score and the messages of the file
+    :return: True if the file was not analyzed
+    """
+    return any(message['symbol'] == 'linter-error'
+               for message in results['messages'])
+
+
+def get_results(python_files, output):
+    """Get the results of each python file from the pylint output
+
+    :param python_files: the python files (relatives to the repository)
+    :param output: the output of json_stats_reporter.JSONStatsReporter with
+                   the messages and the statements of all the files
+    :return: a dict with the score and the messages of each python file
+             analyzed by pylint, the files without statements in the output
+             were not analyzed and they are not included
+    """
+    results = {}
+    for python_file in python_files:
+        if os.path.normpath(python_file) not in output['statements']:
+            continue
+        file_messages = [
+            message for message in output['messages']
+            if os.path.normpath(message['path']) ==
+            os.path.normpath(python_file)]
+        statements = output['statements'].get(
+            os.path.normpath(python_file), 0)
+        results[python_file] = {
+            'score': get_score(file_messages, statements),
+            'messages': file_messages}
+
+    return results
+
+
+def get_pylint_version():
+    """Get the version of pylint, astroid and python used by pylint
+
+    :return: the output of pylint --version, it is only run once per process
+    """
+    global PYLINT_VERSION  # pylint: disable=global-statement
+    if PYLINT_VERSION is None:
+        PYLINT_VERSION = bash('pylint --version').value()
+
+    return PYLINT_VERSION
+
+
+def get_lint_server_version():
+    """Get the version of the lint server
+
+    The lint server keeps the scripts and pylint in memory, so its results are
+    only valid while the scripts and the pylint version are the same
+    :return: a sha1 of LINT_SERVER_SCRIPTS and the pylint version
+    """
+    version = hashlib.sha1(get_pylint_version().encode('utf-8'))
+    folder = os.path.dirname(os.path.abspath(__file__))
+
+    for script in LINT_SERVER_SCRIPTS:
+        with open(os.path.join(folder, script), 'rb') as _file:
+            version.update(_file.read())
+
+    return version.hexdigest()
+
+
+def send_to_server(request, socket_path=LINT_SERVER_SOCKET,
+                   timeout=LINT_SERVER_TIMEOUT):
+    """Send a request to the lint server
+
+    The version of the lint server is added to the request, the lint server
+    refuses the requests of other versions
+    :param request: the request to send
+    :param socket_path: the unix socket of the lint server
+    :param timeout: the seconds to wait for the response
+    :return: the response of the lint server or None if it is not available,
+             it does not answer in time or it is outdated
+    """
+    request = dict(request, version=get_lint_server_version())
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+
+    try:
+        client.connect(socket_path)
+        client.sendall('{}\n'.format(json.dumps(request)).encode('utf-8'))
+        with client.makefile('rb') as response:
+            response = json.loads(response.readline().decode('utf-8'))
+    except socket.timeout:
+        print('lint server timeout after {} seconds'.format(timeout))
+        return None
+    except (IOError, OSError, ValueError):
+        return None
+    finally:
+        client.close()
+
+    if 'error' in response:
+        print('lint server error: {}'.format(response['error']))
+        return None
+
+    return response
+
+
+def lint_on_server(repository, python_files, socket_path=LINT_SERVER_SOCKET):
+    """Send the python files to the lint server
+
+    :param repository: the repository where the python files are
+    :param python_files: the python files (relatives to the repository)
+    :param socket_path: the unix socket of the lint server
+    :return: a dict with the score and the messages of each python file or
+             None if the lint server is not available
+    """
+    return send_to_server({'repository': os.path.abspath(repository),
+                           'files': python_files}, socket_path)
+
+
+def run_pylint(repository, python_files, use_server=True):
+    """Run pylint over the python files in a single invocation
+
+    The python files are sent to the lint server if it is running, otherwise
+    pylint is launched in a new process
+    :param repository: the repository where the python files are
+    :param python_files: the python files (relatives to the repository)
+    :param use_server: send the python files to the lint server, the copies
+                       of other revisions of the repository must not be sent
+                       since the lint server caches the modules by name
+    :return: a dict with the score and the messages of each python file, the
+             files not analyzed have a linter-error message
+    """
+    results = None
+    if use_server:
+        results = lint_on_server(repository, python_files)
+    if results is not None and len(results) == len(python_files):
+        return results
+
+    pylint_config = os.path.join(repository, '.pylintrc')
+    pylint_cmd = ('--rcfile={} --jobs={} --score=no --reports=no '
+                  '--output-format={}').format(
+                      pylint_config, multiprocessing.cpu_count(),
+                      PYLINT_REPORTER)
+
+    # pylint reports the paths relatives to the current directory and loads
+    # the reporter from the folder of this script
+    process = bash('cd {} && PYTHONPATH={}:$PYTHONPATH pylint {} {}'.format(
+        repository, os.path.dirname(os.path.abspath(__file__)), pylint_cmd,
+        ' '.join(python_files)))
+    try:
+        output = json.loads(process.value())
+    except ValueError:
+        # pylint crashed, it was killed or the configuration is not valid
+        output = {'messages': [], 'statements': {}}
+    results = get_results(python_files, output)
+
+    missing = [f for f in python_files if f not in results]
+    if missing:
+        messages = get_linter_errors(
+            missing, get_process_error('pylint', process))
+        for python_file, message in zip(missing, messages):
+            results[python_file] = {'score': 0.0, 'messages': [message]}
+
+    return results
+
+
+def get_cache_salt(repository):
+    """Get the salt for the keys of the cache
+
+    The results of a file are only valid for the same pylint configuration and
+    the same pylint version, so both are part of the key with CACHE_VERSION
+    :param repository: the repository where the .pylintrc file is
+    :return: a sha1 of CACHE_VERSION, the .pylintrc file and the pylint
+             version
+    """
+    salt = hashlib.sha1(CACHE_VERSION.encode('utf-8'))
+    pylint_config = os.path.join(repository, '.pylintrc')
+
+    if os.path.isfile(pylint_config):
+        with open(pylint_config, 'rb') as _file:
+            salt.update(_file.read())
+    salt.update(get_pylint_version().encode('utf-8'))
+
+    return salt.hexdigest()
+
+
+def get_blobs(repository, python_files):
+    """Get the git blob sha of the python files
+
+    :param repository: the repository where the python files are
+    :param python_files: the python files (relatives to the repository)
+    :return: a dict with the blob sha of each python file
+    """
+    blobs = bash('git -C {} hash-object -- {}'.format(
+        repository, ' '.join(python_files))).value().split()
+
+    return dict(zip(python_files, blobs))
+
 
+def evict_cache(results_dir, max_size=CACHE_MAX_SIZE):
+    """Remove the least recently used results of the cache
 
-def python_static_analysis(repository, print_results=False):
+    The cache is shared by the builds of the node, so the entries removed by
+    other run at the same time are ignored
+    :param results_dir: the folder of the results in the cache, the other
+                        files of the cache (e.g: the import graph) are kept
+    :param max_size: the maximum size in bytes allowed for the results
+    """
+    entries = []
+    for entry in os.listdir(results_dir):
+        if not entry.endswith('.json'):
+            continue
+        try:
+            stat = os.stat(os.path.join(results_dir, entry))
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry))
+
+    cache_size = sum(size for _, size, _ in entries)
+    # the oldest entries are removed first
+    for _, size, entry in sorted(entries):
+        if cache_size <= max_size:
+            break
+        try:
+            os.remove(os.path.join(results_dir, entry))
+        except OSError:
+            pass
+        cache_size -= size
+
+
+def read_cache_entry(entry):
+    """Read the results of a python file from the cache
+
+    :param entry: the json file of the results
+    :return: the results or None if the entry does not exist or is not valid
+    """
+    try:
+        with open(entry, 'r') as _file:
+            return json.load(_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write_cache_entry(entry, results):
+    """Write the results of a python file in the cache
+
+    The results are written in a temporary file that is renamed, so an
+    interrupted run does not leave a truncated entry
+    :param entry: the json file of the results
+    :param results: the results of the python file
+    """
+    descriptor, temporary = tempfile.mkstemp(
+        dir=os.path.dirname(entry), suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as _file:
+        json.dump(results, _file)
+    os.rename(temporary, entry)
+
+
+def run_pylint_cached(repository, python_files, cache_dir=CACHE_DIR,
+                      refresh=(), revision='', use_server=True):
+    """Run pylint only over the python files that are not in the cache
+
+    :param repository: the repository where the python files are
+    :param python_files: the python files (relatives to the repository)
+    :param cache_dir: the folder of the cache, the results are kept in its
+                      results folder
+    :param refresh: the python files to analyze even if they are in the cache,
+                    e.g: the files that import a changed module
+    :param revision: the git revision of the whole repository, it is part of
+                     the key when the results must not be shared with other
+                     revisions, e.g: the files that import a changed module
+    :param use_server: send the python files to the lint server, see
+                       run_pylint
+    :return:
+        - results: a dict with the score and the messages of each python file
+        - stats: a dict with the hits and misses of the cache
+    """
+    results_dir = os.path.join(cache_dir, 'results')
+    if not os.path.isdir(results_dir):
+        os.makedirs(results_dir)
+
+    salt = get_cache_salt(repository)
+    entries = {}
+    for python_file, blob in get_blobs(repository, python_files).items():
+        key = hashlib.sha1('{}{}{}'.format(
+            blob, salt, revision).encode('utf-8'))
+        entries[python_file] = os.path.join(
+            results_dir, '{}.json'.format(key.hexdigest()))
+
+    results = {}
+    for python_file, entry in entries.items():
+        if python_file in refresh:
+            continue
+        result = read_cache_entry(entry)
+        if result is None:
+            continue
+        results[python_file] = result
+        # the same content could have been in other path before
+        for message in result['messages']:
+            message['path'] = python_file
+        # refresh the entry for the eviction, other run could have removed it
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+
+    misses = [f for f in python_files if f not in results]
+    if misses:
+        for python_file, result in run_pylint(
+                repository, misses, use_server).items():
+            # the files not analyzed are not cached, so they are tried again
+            if not has_linter_error(result):
+                write_cache_entry(entries[python_file], result)
+            results[python_file] = result
+        evict_cache(results_dir)
+
+    stats = {'hits': len(python_files) - len(misses), 'misses': len(misses)}
+
+    return results, stats
+
+
+def get_base_revision(repository, commit_range=None):
+    """Get the revision the change is based on
+
+    :param repository: the repository of the change
+    :param commit_range: the commits of the change, if it is not provided the
+                         HEAD commit is used
+    :return: the sha of the base revision or None if it has no base, e.g: the
+             first commit of the repository
+    """
+    if commit_range and '...' in commit_range:
+        base = bash('git -C {} merge-base {}'.format(
+            repository, ' '.join(
+                part or 'HEAD' for part in commit_range.split('...'))))
+    else:
+        base = commit_range.split('..')[0] if commit_range else 'HEAD^'
+        base = bash('git -C {} rev-parse --verify -q {}^{{commit}}'.format(
+            repository, base or 'HEAD'))
+
+    return base.value() or None
+
+
+def run_pylint_base(repository, python_files, base):
+    """Run pylint over the python files in the base revision of the change
+
+    The base revision is extracted in a temporary folder and linted in a new
+    process, the lint server would resolve its imports with the modules of
+    the repository it has in memory. The results are cached by the base
+    revision so the next patchsets of the change reuse them
+    :param repository: the repository of the change
+    :param python_files: the python files (relatives to the repository)
+    :param base: the base revision from get_base_revision
+    :return: a dict with the score and the messages of each python file that
+             exists in the base revision
+    """
+    base_files = bash('git -C {} ls-tree -r --name-only {} -- {}'.format(
+        repository, base, ' '.join(python_files))).value().splitlines()
+    if not base_files:
+        return {}
+
+    base_repository = tempfile.mkdtemp(prefix='static_analysis_base_')
+    try:
+        bash('git -C {} archive {} | tar -x -C {}'.format(
+            repository, base, base_repository))
+        results, cache_stats = run_pylint_cached(
+            base_repository, base_files, revision=base, use_server=False)
+    finally:
+        shutil.rmtree(base_repository)
+    print('base cache: {} hits, {} misses'.format(
+        cache_stats['hits'], cache_stats['misses']))
+
+    return results
+
+
+def get_message_key(message):
+    """Get the fields that identify a message of an unchanged file
+
+    :param message: the pylint message (json format)
+    :return: a tuple with the line, the column, the symbol and the text
+    """
+    return (message['line'], message['column'], message['symbol'],
+            message['message'])
+
+
+def get_incremental_results(pylint_results, changed_lines, base_results=None):
+    """Get the status of each python file from the messages of the change
+
+    :param pylint_results: the results of run_pylint_cached
+    :param changed_lines: the changed lines of the python files of the change,
+                          the rest of the files are reverse dependencies
+    :param base_results: the results of the reverse dependencies in the base
+                         revision of the change from run_pylint_base
+    :return: a dict with the score, the status and the messages that count for
+             the verdict of each python file:
+        - files not analyzed: the linter-error message
+        - changed files: all the messages in the changed lines
+        - reverse dependencies: the error and fatal messages that are not in
+          the base revision, since they were introduced by the change
+    """
+    incremental_results = {}
+    base_results = base_results or {}
+
+    for git_file, results in pylint_results.items():
+        if has_linter_error(results):
+            messages = results['messages']
+        elif git_file in changed_lines:
+            messages = [message for message in results['messages']
+                        if message['line'] in changed_lines[git_file]]
+        else:
+            base_messages = set(
+                get_message_key(message) for message in
+                base_results.get(git_file, {}).get('messages', []))
+            messages = [message for message in results['messages']
+                        if message['type'] in ['error', 'fatal'] and
+                        get_message_key(message) not in base_messages]
+
+        incremental_results[git_file] = {
+            'score': results['score'],
+            'status': 'FAIL' if messages else 'PASS',
+            'messages': messages}
+
+    return incremental_results
+
+
+def pylint_analysis(repository, python_files, incremental=False,
+                    commit_range=None):
+    """Perform the static analysis of the python files with pylint
+
+    :param repository: the repository where the python files are
+    :param python_files: the python files (relatives to the repository)
+    :param incremental: analyze also the modules that import the changed,
+                        deleted or renamed modules and only take into account
+                        the messages in the changed lines (see
+                        get_incremental_results)
+    :param commit_range: the commits of the change, if it is not provided the
+                         HEAD commit is used
+    :return: a dict with the status and the score of each python file
+    """
+    dependencies = []
+    if incremental:
+        base = get_base_revision(repository, commit_range)
+        deleted_files = get_deleted_files(repository, commit_range)
+        if deleted_files and base:
+            # the modules that imported the deleted or renamed modules are
+            # only in the import graph of the base revision
+            dependencies = get_reverse_dependencies(
+                build_graph(repository, CACHE_DIR, base), deleted_files)
+        graph = build_graph(repository, CACHE_DIR)
+        dependencies = sorted(
+            (set(dependencies) | set(get_reverse_dependencies(
+                graph, python_files))) & set(graph) - set(python_files))
+        print('reverse dependencies: {}'.format(len(dependencies)))
+
+    pylint_results, cache_stats = run_pylint_cached(
+        repository, python_files + dependencies, refresh=dependencies)
+    print('cache: {} hits, {} misses'.format(
+        cache_stats['hits'], cache_stats['misses']))
+
+    if incremental:
+        base_results = {}
+        if dependencies and base:
+            base_results = run_pylint_base(repository, dependencies, base)
+        return get_incremental_results(pylint_results, get_changed_lines(
+            repository, python_files, commit_range), base_results)
+
+    pylint_scores = {}
+    # iterating over the pylint results to get the status of each file
+    for git_file, results in pylint_results.items():
+        # compare the results with the minimum score
+        if results['score'] < MINIMUM_SCORE_PER_FILE:
+            # this mean that the file does not complies with the rules
+            status = 'FAIL'
+        else:
+            status = 'PASS'
+        tmp_dict = {git_file: {'score': results['score'], 'status': status,
+                               'messages': results['messages']}}
+        pylint_scores.update(tmp_dict)
+
+    return pylint_scores
+
+
+def flake8_analysis(repository, python_files):
+    """Perform the static analysis of the python files with flake8
+
+    flake8 reads its configuration (tox.ini, setup.cfg or .flake8) from the
+    repository
+    :param repository: the repository where the python files are
+    :param python_files: the python files (relatives to the repository)
+    :return: the flake8 messages, the same keys than pylint json output are
+             used, or a fatal message for each file if flake8 failed
+    """
+    flake8_format = '%(path)s:%(row)d:%(col)d:%(code)s:%(text)s'
+    process = bash("cd {} && flake8 --format='{}' {}".format(
+        repository, flake8_format, ' '.join(python_files)))
+    output = process.value()
+
+    messages = []
+    for line in output.splitlines():
+        path, row, col, code, text = line.split(':', 4)
+        messages.append({
+            'type': 'error' if code[0] in 'EF' else 'warning',
+            'path': os.path.normpath(path), 'line': int(row),
+            'column': int(col), 'symbol': code, 'message': text})
+
+    # flake8 exits with 1 when there are messages and when it crashes
+    if process.code and not messages:
+        return get_linter_errors(
+            python_files, get_process_error('flake8', process))
+
+    return messages
+
+
+def shellcheck_analysis(repository, shell_files):
+    """Perform the static analysis of the shell scripts with shellcheck
+
+    :param repository: the repository where the shell scripts are
+    :param shell_files: the shell scripts (relatives to the repository)
+    :return: the shellcheck messages, the same keys than pylint json output
+             are used, or a fatal message for each file if shellcheck failed
+    """
+    process = bash('cd {} && shellcheck -f json {}'.format(
+        repository, ' '.join(shell_files)))
+    output = process.value()
+
+    # shellcheck exits with 1 when there are messages, >1 when it fails
+    if process.code > 1:
+        return get_linter_errors(
+            shell_files, get_process_error('shellcheck', process))
+
+    messages = []
+    for message in json.loads(output) if output else []:
+        messages.append({
+            'type': message['level'], 'path': message['file'],
+            'line': message['line'], 'column': message['column'],
+            'symbol': 'SC{}'.format(message['code']),
+            'message': message['message']})
+
+    return messages
+
+
+def run_linter(linter, repository, git_files, incremental=False,
+               commit_range=None):
+    """Run a linter over its files of the change
+
+    This function is run in a process of the pool of python_static_analysis
+    :param linter: one of LINTERS
+    :param repository: the repository of the change
+    :param git_files: the files of the change for the linter
+    :param incremental: only take into account the messages in the changed
+                        lines
+    :param commit_range: the commits of the change, if it is not provided the
+                         HEAD commit is used
+    :return: a dict with the status and the messages of each file
+    """
+    if linter == 'pylint':
+        return pylint_analysis(
+            repository, git_files, incremental, commit_range)
+
+    if linter == 'flake8':
+        messages = flake8_analysis(repository, git_files)
+    else:
+        messages = shellcheck_analysis(repository, git_files)
+
+    if incremental:
+        changed_lines = get_changed_lines(
+            repository, git_files, commit_range)
+        # the errors of the linter itself are not in the changed lines
+        messages = [message for message in messages
+                    if message['line'] in changed_lines[message['path']] or
+                    message['symbol'] == 'linter-error']
+
+    results = {}
+    for git_file in git_files:
+        file_messages = [message for message in messages
+                         if message['path'] == git_file]
+        results[git_file] = {'status': 'FAIL' if file_messages else 'PASS',
+                             'messages': file_messages}
+
+    return results
+
+
+def write_reports(linters_results):
+    """Write the merged results of the linters in json and checkstyle format
+
+    :param linters_results: a dict with the results of each linter
+    """
+    with open(REPORT_JSON, 'w') as report:
+        json.dump(linters_results, report, indent=4)
+
+    checkstyle = ElementTree.Element('checkstyle', version='4.3')
+    files = {}
+    for linter, results in sorted(linters_results.items()):
+        for git_file, file_results in sorted(results.items()):
+            if git_file not in files:
+                files[git_file] = ElementTree.SubElement(
+                    checkstyle, 'file', name=git_file)
+            for message in file_results['messages']:
+                ElementTree.SubElement(
+                    files[git_file], 'error', line=str(message['line']),
+                    column=str(message['column']),
+                    severity=SEVERITIES.get(message['type'], 'info'),
+                    message=message['message'],
+                    source='{}.{}'.format(linter, message['symbol']))
+
+    ElementTree.ElementTree(checkstyle).write(REPORT_CHECKSTYLE)
+
+
+def python_static_analysis(repository, print_results=False, incremental=False,
+                           commit_range=None, linters=('pylint',)):
     """Perform a static analysis
 
-    This function perform a static analysis to python modules with pylint
+    This function perform a static analysis to python modules with pylint,
+    and optionally with flake8, and to shell scripts with shellcheck. The
+    files of the change are discovered once and the linters are run at the
+    same time in a pool of processes
     :param repository: the repository to perform the analysis
     :param print_results: print the results of the static analysis performed
+    :param incremental: analyze also the modules that import the changed
+                        modules and only take into account the messages in the
+                        changed lines (see get_incremental_results)
+    :param commit_range: the commits to analyze, if it is not provided the
+                         HEAD commit is used, it must end in HEAD (see
+                         check_commit_range)
+    :param linters: the linters to run, see LINTERS
     :return:
         - PASS: when all the python modules in a change has the same or greater
-                than the minimum score allowed
+                than the minimum score allowed and there is not messages from
+                flake8 and shellcheck
         - FAIL: when some python module has the score lower than the minimum
-                score allowed
-        - NOT_RUN: if there is not python files in the Gerrit patch
-    """
-    sha = bash('git -C {} rev-parse HEAD'.format(repository)).stdout
-    git_files = bash('git -C {} diff-tree --no-commit-id --name-only -r {}'
-                     .format(repository, sha)).stdout.split()
-    python_files = []
-
-    for f in git_files:
-        if '.py' in f:
-            python_files.append(f)
-
-    if python_files:
-        # pylint variables
-        pylint_config = '{}/{}'.format(repository, '.pylintrc')
-        pylint_cmd = ('--rcfile={} --jobs=2  --score=yes --reports=no '
-                      '--output-format=text').format(pylint_config)
-
-        pylint_scores = {}
-        status = None
-
-        # iterating over the python files to get the results
-        for git_file in git_files:
-            file_path = os.path.join(repository, git_file)
-            file_score = bash('pylint {} {}'.format(pylint_cmd, file_path))
-            file_score = file_score.stdout.split()[-2:][:1][0].replace(
-                '/10', '').replace(',', '')
-
-            # compare the results with the minimum score
-            if float(file_score) < MINIMUM_SCORE_PER_FILE:
-                # this mean that the file does not complies with the rules
-                status = 'FAIL'
-            elif float(file_score) >= MINIMUM_SCORE_PER_FILE:
-                status = 'PASS'
-            tmp_dict = {git_file: {'score': file_score, 'status': status}}
-            pylint_scores.update(tmp_dict)
+                score allowed or there is some message from flake8 or
+                shellcheck
+        - NOT_RUN: if there is not files to analyze in the Gerrit patch
+    """
+    check_commit_range(repository, commit_range)
+    git_files = get_changed_files(repository, commit_range)
+    python_files = [f for f in git_files if f.endswith('.py')]
+    shell_files = [f for f in git_files if f.endswith('.sh')]
+    linters_files = {'pylint': python_files, 'flake8': python_files,
+                     'shellcheck': shell_files}
+
+    # the deleted python modules could break the modules that import them
+    deleted_files = get_deleted_files(repository, commit_range) \
+        if incremental else []
+    linters = [linter for linter in linters if linters_files[linter] or
+               linter == 'pylint' and deleted_files]
+    # the files of the requested linters that are not installed fail
+    linters_results = {}
+    for linter in linters[:]:
+        if not bash('command -v {}'.format(linter)).value():
+            print('{} is not installed'.format(linter))
+            linters.remove(linter)
+            messages = get_linter_errors(
+                linters_files[linter], '{} is not installed'.format(linter))
+            linters_results[linter] = dict(
+                (message['path'], {'status': 'FAIL', 'messages': [message]})
+                for message in messages)
+
+    if linters or linters_results:
+        if linters:
+            pool = multiprocessing.Pool(len(linters))
+            jobs = dict((linter, pool.apply_async(run_linter, (
+                linter, repository, linters_files[linter], incremental,
+                commit_range))) for linter in linters)
+            pool.close()
+            pool.join()
+
+            linters_results.update(
+                (linter, job.get()) for linter, job in jobs.items())
+        write_reports(linters_results)
 
         if print_results in ['TRUE', 'True']:
-            print(pylint_scores)
+            for linter, results in sorted(linters_results.items()):
+                for file_results in results.values():
+                    file_results['messages'] = [
+                        '{}:{}: {} ({})'.format(
+                            message['path'], message['line'],
+                            message['message'], message['symbol'])
+                        for message in file_results['messages']]
+                print('{}: {}'.format(linter, results))
         else:
-            # check if there were any score lower than minimum score acceptable
-            for git_file, results in pylint_scores.items():
-                if results['status'] == 'FAIL':
-                    with open(VERDICT, 'w') as verdict:
-                        verdict.write('FAIL')
-                    return
+            # check if there were any file that does not complies with the
+            # rules of some linter
+            for results in linters_results.values():
+                for git_file, file_results in results.items():
+                    if file_results['status'] == 'FAIL':
+                        with open(VERDICT, 'w') as verdict:
+                            verdict.write('FAIL')
+                        return
 
             with open(VERDICT, 'w') as verdict:
                 verdict.write('PASS')
@@ -77,8 +891,36 @@ def python_static_analysis(repository, print_results=False):
             verdict.write('NOT_RUN')
 
 
+def arguments():
+    """Define and handle arguments with options to run the script
+
+    Return:
+     - parser.parse_args(): list arguments as objects assigned as attributes
+       of a namespace
+    """
+
+    description = 'Script used to run static analysis over python files'
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('repository', help='the repository to analyze')
+    parser.add_argument(
+        'print_results', nargs='?', default=False,
+        help='True to print the results instead of writing the verdict')
+    parser.add_argument(
+        '--incremental', dest='incremental', action='store_true',
+        help='analyze also the modules that import the changed modules and '
+             'only take into account the messages in the changed lines')
+    parser.add_argument(
+        '--range', dest='commit_range',
+        help='the commits to analyze (e.g: HEAD~3..HEAD), by default the '
+             'HEAD commit, the range must end in HEAD')
+    parser.add_argument(
+        '--linters', dest='linters', nargs='+', choices=LINTERS,
+        default=['pylint'], help='the linters to run at the same time')
+
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
-    try:
-        python_static_analysis(sys.argv[1], sys.argv[2])
-    except IndexError:
-        python_static_analysis(sys.argv[1])
+    ARGS = arguments()
+    python_static_analysis(ARGS.repository, ARGS.print_results,
+                           ARGS.incremental, ARGS.commit_range, ARGS.linters)